@@ -14,19 +14,65 @@ Supports:
 __version__ = "1.1.0"
 __author__ = "Analytics Team"
 
-from .auth_middleware import AuthMiddleware, require_permission, require_any_permission, get_current_user
-from .auth_client import AuthClient
-from .permissions import PermissionRegistry
+import importlib
+import logging
+from typing import TYPE_CHECKING
+
 from .exceptions import AuthError, PermissionDeniedError, InvalidTokenError
-from .service_discovery import ServiceDiscoveryClient, init_service_discovery_flask, init_service_discovery_fastapi
+
+# Logging is configured by the host application; stay silent until it does
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+if TYPE_CHECKING:
+    from .auth_middleware import (
+        AuthMiddleware, require_permission, require_any_permission, get_current_user, set_user_context
+    )
+    from .auth_client import AuthClient
+    from .async_auth_client import AsyncAuthClient, init_auth_fastapi
+    from .permissions import PermissionRegistry
+    from .service_discovery import ServiceDiscoveryClient, init_service_discovery_flask, init_service_discovery_fastapi
+
+# Public names are imported from their submodule on first access, so that
+# `import auth_connector` doesn't pull in Flask, requests or httpx up front
+_LAZY_EXPORTS = {
+    "AuthMiddleware": ".auth_middleware",
+    "require_permission": ".auth_middleware",
+    "require_any_permission": ".auth_middleware",
+    "get_current_user": ".auth_middleware",
+    "set_user_context": ".auth_middleware",
+    "AuthClient": ".auth_client",
+    "AsyncAuthClient": ".async_auth_client",
+    "init_auth_fastapi": ".async_auth_client",
+    "PermissionRegistry": ".permissions",
+    "ServiceDiscoveryClient": ".service_discovery",
+    "init_service_discovery_flask": ".service_discovery",
+    "init_service_discovery_fastapi": ".service_discovery",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_EXPORTS))
+
 
 __all__ = [
     "AuthMiddleware",
     "AuthClient", 
+    "AsyncAuthClient",
+    "init_auth_fastapi",
     "PermissionRegistry",
     "require_permission",
     "require_any_permission",
     "get_current_user",
+    "set_user_context",
     "AuthError",
     "PermissionDeniedError", 
     "InvalidTokenError",
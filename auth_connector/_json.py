@@ -0,0 +1,32 @@
+"""
+JSON helpers that use orjson when installed and fall back to the stdlib
+"""
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+import json
+
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps(obj) -> bytes:
+        """Serialize obj to UTF-8 encoded JSON bytes"""
+        return orjson.dumps(obj)
+
+    def dumps_indented(obj) -> str:
+        """Serialize obj to a human-readable JSON string with 2-space indent"""
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode('utf-8')
+else:
+    loads = json.loads
+
+    def dumps(obj) -> bytes:
+        """Serialize obj to UTF-8 encoded JSON bytes"""
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def dumps_indented(obj) -> str:
+        """Serialize obj to a human-readable JSON string with 2-space indent"""
+        return json.dumps(obj, indent=2, ensure_ascii=False)
@@ -0,0 +1,220 @@
+"""
+Async auth client for communicating with auth-service from ASGI applications
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Any
+import logging
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+from .exceptions import AuthServiceUnavailableError, InvalidTokenError, ConfigurationError
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAuthClient:
+    """Async client for auth-service communication (mirrors AuthClient)"""
+
+    def __init__(self, auth_service_url: str, service_key: str, timeout: int = 10,
+                 api_key: str = None, http2: bool = True):
+        if httpx is None:
+            raise ConfigurationError(
+                "AsyncAuthClient requires httpx: pip install 'auth-connector[async]'"
+            )
+
+        self.auth_service_url = auth_service_url.rstrip('/')
+        self.service_key = service_key
+        self.timeout = timeout
+        self._api_key = api_key or os.getenv('INTERNAL_API_KEY', '')
+        self._cache = {}
+        self._cache_ttl = {}
+
+        headers = {'X-API-Key': self._api_key} if self._api_key else {}
+        client_kwargs = dict(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=self.timeout,
+            headers=headers,
+        )
+        try:
+            self._client = httpx.AsyncClient(http2=http2, **client_kwargs)
+        except ImportError:
+            # h2 not installed - plain HTTP/1.1 keep-alive
+            self._client = httpx.AsyncClient(**client_kwargs)
+
+    @property
+    def api_headers(self) -> Dict[str, str]:
+        """Return headers dict with X-API-Key for use in direct HTTP calls"""
+        if self._api_key:
+            return {'X-API-Key': self._api_key}
+        return {}
+
+    async def get_user_permissions(self, user_id: str, force_refresh: bool = False) -> List[str]:
+        """Get user permissions for this service.
+
+        DEPRECATED: see AuthClient.get_user_permissions().
+        """
+        import warnings
+        warnings.warn(
+            "AsyncAuthClient.get_user_permissions() is deprecated. "
+            "Use X-User-Service-Permissions header from nginx gateway instead.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        cache_key = f"permissions:{user_id}"
+
+        # Check cache first
+        if not force_refresh and self._is_cached(cache_key):
+            return self._cache[cache_key]
+
+        try:
+            url = f"{self.auth_service_url}/api/users/{user_id}/permissions/{self.service_key}"
+            response = await self._client.get(url)
+
+            if response.status_code == 404:
+                return []  # User has no permissions for this service
+
+            response.raise_for_status()
+            data = response.json()
+            permissions = data.get('permissions', [])
+
+            # Cache for 5 minutes
+            self._cache[cache_key] = permissions
+            self._cache_ttl[cache_key] = time.monotonic() + 300.0
+
+            return permissions
+
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to get user permissions: {e}")
+            # Return cached data if available, otherwise empty list
+            return self._cache.get(cache_key, [])
+
+    async def get_user_document(self, user_id: str, document_type: str = None) -> Optional[Dict[str, Any]]:
+        """Get user document from auth-service"""
+        try:
+            url = f"{self.auth_service_url}/api/users/{user_id}/documents"
+            params = {"type": document_type} if document_type else {}
+
+            response = await self._client.get(url, params=params)
+
+            if response.status_code == 404:
+                return None
+
+            response.raise_for_status()
+            return response.json()
+
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to get user document: {e}")
+            return None
+
+    async def validate_token(self, token: str) -> Dict[str, Any]:
+        """Validate auth token and get user info"""
+        try:
+            url = f"{self.auth_service_url}/api/validate-token"
+            headers = {"Authorization": f"Bearer {token}"}
+
+            response = await self._client.post(url, headers=headers)
+
+            if response.status_code == 401:
+                raise InvalidTokenError("Token is invalid or expired")
+
+            response.raise_for_status()
+            return response.json()
+
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to validate token: {e}")
+            raise AuthServiceUnavailableError(f"Auth service unavailable: {e}")
+
+    async def validate_tokens(self, tokens: List[str]) -> List[Any]:
+        """Validate several tokens concurrently.
+
+        Returns results in input order; a failed validation yields the raised
+        exception instance instead of a user info dict.
+        """
+        return await asyncio.gather(
+            *(self.validate_token(token) for token in tokens),
+            return_exceptions=True,
+        )
+
+    async def sync_permissions(self, permissions: List[Dict[str, str]]) -> bool:
+        """Sync service permissions with auth-service"""
+        try:
+            url = f"{self.auth_service_url}/api/services/{self.service_key}/permissions/sync"
+            payload = {
+                "service_key": self.service_key,
+                "permissions": permissions
+            }
+
+            response = await self._client.post(url, json=payload)
+            response.raise_for_status()
+
+            logger.info(f"Successfully synced {len(permissions)} permissions for service {self.service_key}")
+            return True
+
+        except httpx.HTTPError as e:
+            logger.error(f"Failed to sync permissions: {e}")
+            return False
+
+    async def health_check(self) -> bool:
+        """Check if auth-service is available"""
+        try:
+            response = await self._client.get(f"{self.auth_service_url}/health")
+            return response.status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    def _is_cached(self, key: str) -> bool:
+        """Check if data is cached and not expired"""
+        return key in self._cache and self._cache_ttl.get(key, 0.0) > time.monotonic()
+
+    def clear_cache(self):
+        """Clear all cached data"""
+        self._cache.clear()
+        self._cache_ttl.clear()
+
+    async def aclose(self):
+        """Close the underlying HTTP client and its pooled connections"""
+        await self._client.aclose()
+
+
+# FastAPI integration
+def init_auth_fastapi(app, auth_client: AsyncAuthClient):
+    """
+    Attach user info to every FastAPI request without blocking the event loop
+
+    The bearer token from the Authorization header is validated through
+    auth-service and the result is stored on ``request.state.user``
+    (``None`` when missing or invalid), next to ``request.state.auth_client``.
+
+    Example:
+        from fastapi import FastAPI
+        from auth_connector import AsyncAuthClient, init_auth_fastapi
+
+        app = FastAPI()
+        auth_client = AsyncAuthClient("http://gateway:8080", "my-service")
+        init_auth_fastapi(app, auth_client)
+    """
+    @app.middleware("http")
+    async def auth_middleware(request, call_next):
+        request.state.user = None
+        request.state.auth_client = auth_client
+
+        auth_header = request.headers.get('Authorization', '')
+        if auth_header.startswith('Bearer '):
+            try:
+                request.state.user = await auth_client.validate_token(auth_header[7:])
+            except (InvalidTokenError, AuthServiceUnavailableError) as e:
+                logger.error(f"Failed to validate token: {e}")
+
+        return await call_next(request)
+
+    @app.on_event("shutdown")
+    async def close_auth_client():
+        await auth_client.aclose()
+
+    return auth_client
@@ -2,31 +2,68 @@
 Auth client for communicating with auth-service
 """
 
+import gzip
 import os
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cachetools import LRUCache, TTLCache
 import json
-from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any, MutableMapping
 import logging
+from . import _json
 from .exceptions import AuthServiceUnavailableError, InvalidTokenError
 
 logger = logging.getLogger(__name__)
 
+# Permissions cache bounds: entries are fresh for 5 minutes, and the last
+# known value is kept (LRU-bounded) as a fallback when auth-service is down.
+_PERMISSIONS_CACHE_SIZE = 10000
+_PERMISSIONS_CACHE_TTL = 300
+
+# Circuit breaker: this many failures within the window skip HTTP for the cooldown
+_CB_FAILURE_THRESHOLD = 5
+_CB_WINDOW = 30.0
+_CB_COOLDOWN = 30.0
+
+# Smallest sync body worth gzip-compressing when compression is requested
+_GZIP_MIN_BYTES = 1024
+
 
 class AuthClient:
     """Client for auth-service communication"""
     
     def __init__(self, auth_service_url: str, service_key: str, timeout: int = 10,
-                 api_key: str = None):
+                 api_key: str = None, cache: MutableMapping = None):
         self.auth_service_url = auth_service_url.rstrip('/')
         self.service_key = service_key
         self.timeout = timeout
         self._api_key = api_key or os.getenv('INTERNAL_API_KEY', '')
-        self._cache = {}
-        self._cache_ttl = {}
+        # A custom fresh-permissions cache must expire entries itself (get() -> None when missing)
+        if cache is None:
+            cache = TTLCache(maxsize=_PERMISSIONS_CACHE_SIZE, ttl=_PERMISSIONS_CACHE_TTL)
+        self._perm_cache = cache
+        self._cache = LRUCache(maxsize=_PERMISSIONS_CACHE_SIZE)
+        self._cache_lock = threading.Lock()
+        # Per-key locks so concurrent misses for one user share a single fetch
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._cb_failures = 0
+        self._cb_window_start = 0.0
+        self._cb_open_until = 0.0
         
-        # Session with default X-API-Key header for all requests
+        # Pooled keep-alive session with default X-API-Key header for all requests
         self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=50,
+            max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=(502, 503, 504)),
+        )
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._session.headers['Connection'] = 'keep-alive'
         if self._api_key:
             self._session.headers['X-API-Key'] = self._api_key
     
@@ -62,34 +99,134 @@ class AuthClient:
             "Use X-User-Service-Permissions header instead.",
             user_id, self.service_key,
         )
+        return self._get_user_permissions(user_id, force_refresh)
+    
+    def _get_user_permissions(self, user_id: str, force_refresh: bool = False) -> List[str]:
+        """Cached, coalesced permissions lookup without the per-call deprecation notices"""
         cache_key = f"permissions:{user_id}"
         
         # Check cache first
-        if not force_refresh and self._is_cached(cache_key):
-            return self._cache[cache_key]
+        if not force_refresh:
+            permissions = self._get_cached(cache_key)
+            if permissions is not None:
+                return permissions
+        
+        with self._locks_guard:
+            lock = self._locks.setdefault(cache_key, threading.Lock())
+        
+        with lock:
+            try:
+                # Another thread may have fetched it while we waited
+                if not force_refresh:
+                    permissions = self._get_cached(cache_key)
+                    if permissions is not None:
+                        return permissions
+                return self._fetch_user_permissions(user_id, cache_key)
+            finally:
+                with self._locks_guard:
+                    if self._locks.get(cache_key) is lock:
+                        del self._locks[cache_key]
+    
+    def _fetch_user_permissions(self, user_id: str, cache_key: str) -> List[str]:
+        """Fetch user permissions from auth-service and cache them"""
+        if self._circuit_open():
+            with self._cache_lock:
+                return self._cache.get(cache_key, [])
         
         try:
             url = f"{self.auth_service_url}/api/users/{user_id}/permissions/{self.service_key}"
             response = self._session.get(url, timeout=self.timeout)
             
             if response.status_code == 404:
-                return []  # User has no permissions for this service
+                # User has no permissions for this service (cached like any answer)
+                self._set_cached(cache_key, [])
+                self._record_success()
+                return []
             
             response.raise_for_status()
             data = response.json()
             permissions = data.get('permissions', [])
             
-            # Cache for 5 minutes
-            self._cache[cache_key] = permissions
-            self._cache_ttl[cache_key] = datetime.now() + timedelta(minutes=5)
-            
+            self._set_cached(cache_key, permissions)
+            self._record_success()
             return permissions
             
         except requests.RequestException as e:
             logger.error(f"Failed to get user permissions: {e}")
-            # Return cached data if available, otherwise empty list
-            return self._cache.get(cache_key, [])
+            self._record_failure()
+            # Return last known data if available, otherwise empty list
+            with self._cache_lock:
+                return self._cache.get(cache_key, [])
     
+    def get_user_permissions_many(self, user_ids: List[str],
+                                  force_refresh: bool = False) -> Dict[str, List[str]]:
+        """Get permissions for several users in a single round-trip.
+
+        Cached users are served locally; the rest are fetched with one POST to
+        /api/services/{service_key}/permissions/batch, which is expected to
+        answer {"permissions": {user_id: [...]}}.
+        
+        DEPRECATED: like get_user_permissions(), this relies on an auth-service
+        endpoint that does not exist. Use X-User-Service-Permissions header instead.
+        """
+        import warnings
+        warnings.warn(
+            "AuthClient.get_user_permissions_many() is deprecated. "
+            "Use X-User-Service-Permissions header from nginx gateway instead.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        logger.warning(
+            "DEPRECATED: get_user_permissions_many() called for %d users service=%s. "
+            "This endpoint does not exist in auth-service. "
+            "Use X-User-Service-Permissions header instead.",
+            len(user_ids), self.service_key,
+        )
+        result = {}
+        missing = []
+        # Each user is looked up (and sent) once, even if listed repeatedly
+        for user_id in dict.fromkeys(user_ids):
+            cache_key = f"permissions:{user_id}"
+            permissions = None if force_refresh else self._get_cached(cache_key)
+            if permissions is not None:
+                result[user_id] = permissions
+            else:
+                missing.append(user_id)
+
+        if not missing:
+            return result
+
+        if self._circuit_open():
+            with self._cache_lock:
+                for user_id in missing:
+                    result[user_id] = self._cache.get(f"permissions:{user_id}", [])
+            return result
+
+        try:
+            url = f"{self.auth_service_url}/api/services/{self.service_key}/permissions/batch"
+            response = self._session.post(url, json={"user_ids": missing}, timeout=self.timeout)
+            response.raise_for_status()
+            fetched = response.json().get('permissions', {})
+
+            with self._cache_lock:
+                for user_id in missing:
+                    permissions = fetched.get(user_id, [])
+                    cache_key = f"permissions:{user_id}"
+                    self._perm_cache[cache_key] = permissions
+                    self._cache[cache_key] = permissions
+                    result[user_id] = permissions
+            self._record_success()
+
+        except requests.RequestException as e:
+            logger.error(f"Failed to get batch user permissions: {e}")
+            self._record_failure()
+            # Fall back to last known data where available
+            with self._cache_lock:
+                for user_id in missing:
+                    result[user_id] = self._cache.get(f"permissions:{user_id}", [])
+
+        return result
+
     def get_user_document(self, user_id: str, document_type: str = None) -> Optional[Dict[str, Any]]:
         """Get user document from auth-service"""
         try:
@@ -126,8 +263,12 @@ class AuthClient:
             logger.error(f"Failed to validate token: {e}")
             raise AuthServiceUnavailableError(f"Auth service unavailable: {e}")
     
-    def sync_permissions(self, permissions: List[Dict[str, str]]) -> bool:
-        """Sync service permissions with auth-service"""
+    def sync_permissions(self, permissions: List[Dict[str, str]], compress: bool = False) -> bool:
+        """Sync service permissions with auth-service.
+        
+        With compress=True, bodies over 1 KB are sent gzip-encoded
+        (auth-service must accept Content-Encoding: gzip).
+        """
         try:
             url = f"{self.auth_service_url}/api/services/{self.service_key}/permissions/sync"
             payload = {
@@ -135,7 +276,13 @@ class AuthClient:
                 "permissions": permissions
             }
             
-            response = self._session.post(url, json=payload, timeout=self.timeout)
+            body = _json.dumps(payload)
+            headers = {'Content-Type': 'application/json'}
+            if compress and len(body) > _GZIP_MIN_BYTES:
+                body = gzip.compress(body)
+                headers['Content-Encoding'] = 'gzip'
+            
+            response = self._session.post(url, data=body, headers=headers, timeout=self.timeout)
             response.raise_for_status()
             
             logger.info(f"Successfully synced {len(permissions)} permissions for service {self.service_key}")
@@ -154,15 +301,45 @@ class AuthClient:
         except:
             return False
     
-    def _is_cached(self, key: str) -> bool:
-        """Check if data is cached and not expired"""
-        if key not in self._cache:
-            return False
-        if key not in self._cache_ttl:
-            return False
-        return datetime.now() < self._cache_ttl[key]
+    def _circuit_open(self) -> bool:
+        """Check if recent failures have tripped the breaker"""
+        return time.monotonic() < self._cb_open_until
+    
+    def _record_failure(self):
+        """Count a failed call and trip the breaker on repeated failures"""
+        now = time.monotonic()
+        if now - self._cb_window_start > _CB_WINDOW:
+            self._cb_window_start = now
+            self._cb_failures = 0
+        self._cb_failures += 1
+        if self._cb_failures >= _CB_FAILURE_THRESHOLD:
+            self._cb_open_until = now + _CB_COOLDOWN
+            logger.warning(
+                f"Auth service failing, serving cached permissions for {_CB_COOLDOWN:.0f}s"
+            )
+    
+    def _record_success(self):
+        """Reset the breaker after a successful call"""
+        self._cb_failures = 0
+        self._cb_open_until = 0.0
+    
+    def _get_cached(self, key: str) -> Optional[List[str]]:
+        """Return cached data if present and not expired"""
+        with self._cache_lock:
+            return self._perm_cache.get(key)
+    
+    def _set_cached(self, key: str, value: List[str]):
+        """Store fresh data and remember it as the last known value"""
+        with self._cache_lock:
+            self._perm_cache[key] = value
+            self._cache[key] = value
     
     def clear_cache(self):
         """Clear all cached data"""
-        self._cache.clear()
-        self._cache_ttl.clear()
\ No newline at end of file
+        with self._cache_lock:
+            self._perm_cache.clear()
+            self._cache.clear()
+    
+    def close(self):
+        """Close the underlying HTTP session and its pooled connections"""
+        self._session.close()
@@ -3,58 +3,145 @@ Authentication middleware and decorators for Flask applications
 """
 
 import jwt
+from jwt.algorithms import HMACAlgorithm
 import json
 import base64
-from functools import wraps
-from typing import List, Optional, Dict, Any, Callable
-from flask import request, g, jsonify, current_app
+import binascii
+import hashlib
+import threading
+import time
+from cachetools import TTLCache
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+from typing import List, Optional, Dict, Any, Callable, Mapping
+from flask import request, g, current_app
 import logging
 
+from . import _json
 from .auth_client import AuthClient
 from .exceptions import PermissionDeniedError, InvalidTokenError, ConfigurationError
 
 logger = logging.getLogger(__name__)
 
+_JWT_ALGORITHMS = ['HS256']
+
+# Header names and auth scheme, shared by every lookup
+_AUTHORIZATION = 'Authorization'
+_BEARER = 'Bearer'
+_X_USER_ID = 'X-User-Id'
+_X_USER_NAME = 'X-User-Name'
+_X_USER_FULL_NAME = 'X-User-Full-Name'
+_X_USER_SERVICE_ROLES = 'X-User-Service-Roles'
+_X_USER_SERVICE_PERMISSIONS = 'X-User-Service-Permissions'
+_X_USER_ADMIN = 'X-User-Admin'
+_X_INTERNAL_AUTH = 'X-Internal-Auth'
+
+# Decoded JWTs are reused for at most this long (and never past their exp)
+_JWT_CACHE_SIZE = 4096
+_JWT_CACHE_TTL = 300
+
+# Internal service tokens repeat verbatim across calls from the same upstream
+_INTERNAL_CACHE_SIZE = 1024
+_INTERNAL_CACHE_TTL = 60
+
+
+@lru_cache(maxsize=2048)
+def _decode_header_b64(value: str) -> str:
+    """Decode base64 encoded header value, returning it unchanged if not base64"""
+    try:
+        return base64.b64decode(value, validate=True).decode('utf-8')
+    except (binascii.Error, UnicodeDecodeError):
+        return value
+
+
+def _parse_csv(value: str) -> tuple:
+    """Parse a comma-separated header value in header order, stripping items and skipping empty ones"""
+    if not value:
+        return ()
+    return tuple(item for item in map(str.strip, value.split(',')) if item)
+
+
+def _parse_bool(value: str) -> bool:
+    """Parse a 'true'/'false' header value"""
+    return value.lower() == 'true'
+
+
+# (header, UserContext field, parser) for gateway-injected headers
+_GATEWAY_SPEC = (
+    (_X_USER_ID, 'user_id', str),
+    (_X_USER_NAME, 'username', str),
+    (_X_USER_FULL_NAME, 'full_name', _decode_header_b64),
+    (_X_USER_SERVICE_ROLES, 'roles', _parse_csv),
+    (_X_USER_SERVICE_PERMISSIONS, 'permissions', _parse_csv),
+    (_X_USER_ADMIN, 'is_admin', _parse_bool),
+)
+
 
 class UserContext:
     """User context extracted from auth headers"""
     
+    __slots__ = ('user_id', 'username', 'full_name', 'roles', 'permissions', 'is_admin',
+                 '_raw_headers_src', '_raw_headers', '_roles_set', '_permissions_set',
+                 '_wildcard_prefixes')
+    
     def __init__(self, user_id: str, username: str, full_name: str = None, 
                  roles: List[str] = None, permissions: List[str] = None, 
-                 is_admin: bool = False, raw_headers: Dict[str, str] = None):
+                 is_admin: bool = False, raw_headers: Mapping[str, str] = None):
         self.user_id = user_id
         self.username = username
         self.full_name = full_name or username
-        self.roles = roles or []
-        self.permissions = permissions or []
+        # Tuples from header parsing are kept as-is; indexes are built once below
+        self.roles = tuple(roles or ())
+        self._roles_set = frozenset(self.roles)
+        self._load_permissions(permissions)
         self.is_admin = is_admin
-        self.raw_headers = raw_headers or {}
+        # Copied into a dict only when someone actually reads raw_headers
+        self._raw_headers_src = raw_headers
+        self._raw_headers = None
+    
+    @property
+    def raw_headers(self) -> Dict[str, str]:
+        """Request headers the context was built from, as a plain dict"""
+        if self._raw_headers is None:
+            self._raw_headers = dict(self._raw_headers_src or {})
+        return self._raw_headers
+    
+    def _load_permissions(self, permissions):
+        """Store permissions with a hashed index and precomputed wildcard prefixes"""
+        self.permissions = tuple(permissions or ())
+        self._permissions_set = frozenset(self.permissions)
+        # 'referal.*' -> 'referal.'
+        self._wildcard_prefixes = tuple(p[:-1] for p in self.permissions if p.endswith('.*'))
+    
+    def _with_permissions(self, permissions) -> 'UserContext':
+        """Copy of this context carrying permissions; cached contexts are shared and stay untouched"""
+        return UserContext(self.user_id, self.username, self.full_name, self.roles,
+                           permissions, self.is_admin, self._raw_headers_src)
     
     def has_permission(self, permission: str) -> bool:
         """Check if user has specific permission.
         Supports wildcard permissions: 'referal.*' matches 'referal.profile.view'.
         """
-        if permission in self.permissions:
+        if permission in self._permissions_set:
             return True
-        # Check if any user permission is a wildcard that covers the requested one
-        for perm in self.permissions:
-            if perm.endswith('.*'):
-                prefix = perm[:-1]  # e.g. 'referal.*' -> 'referal.'
-                if permission.startswith(prefix):
-                    return True
-        return False
+        return bool(self._wildcard_prefixes) and permission.startswith(self._wildcard_prefixes)
     
     def has_any_permission(self, permissions: List[str]) -> bool:
         """Check if user has any of the specified permissions"""
-        return any(self.has_permission(perm) for perm in permissions)
+        if not self._permissions_set.isdisjoint(permissions):
+            return True
+        return bool(self._wildcard_prefixes) and any(self.has_permission(perm) for perm in permissions)
     
     def has_all_permissions(self, permissions: List[str]) -> bool:
         """Check if user has all specified permissions"""
-        return all(self.has_permission(perm) for perm in permissions)
+        if self._permissions_set.issuperset(permissions):
+            return True
+        return bool(self._wildcard_prefixes) and all(self.has_permission(perm) for perm in permissions)
     
     def has_role(self, role: str) -> bool:
         """Check if user has specific role"""
-        return role in self.roles
+        return role in self._roles_set
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary"""
@@ -62,8 +149,8 @@ class UserContext:
             "user_id": self.user_id,
             "username": self.username,
             "full_name": self.full_name,
-            "roles": self.roles,
-            "permissions": self.permissions,
+            "roles": list(self.roles),
+            "permissions": list(self.permissions),
             "is_admin": self.is_admin
         }
 
@@ -77,6 +164,20 @@ class AuthMiddleware:
         self.jwt_secret = jwt_secret
         self.verify_signature = verify_signature
         
+        # Validate and convert the HS256 secret once instead of on every decode
+        self._jwt_decoder = jwt.PyJWT()
+        self._jwt_key = None
+        if jwt_secret:
+            try:
+                self._jwt_key = HMACAlgorithm(HMACAlgorithm.SHA256).prepare_key(jwt_secret)
+            except jwt.InvalidKeyError as e:
+                raise ConfigurationError(f"Invalid JWT secret: {e}")
+        
+        # Decoded tokens keyed by a short digest so raw tokens are never stored
+        self._jwt_cache = TTLCache(maxsize=_JWT_CACHE_SIZE, ttl=_JWT_CACHE_TTL)
+        self._internal_cache = TTLCache(maxsize=_INTERNAL_CACHE_SIZE, ttl=_INTERNAL_CACHE_TTL)
+        self._cache_lock = threading.Lock()
+        
         if app is not None:
             self.init_app(app)
     
@@ -91,6 +192,13 @@ class AuthMiddleware:
     
     def before_request(self):
         """Extract user context from request headers"""
+        # Reuse a context seeded by the caller (see set_user_context)
+        user_context = _user_ctxvar.get()
+        if user_context is not None:
+            g.user = user_context
+            g.auth_client = self.auth_client
+            return
+        
         try:
             user_context = self.extract_user_context(request.headers)
             g.user = user_context
@@ -104,20 +212,19 @@ class AuthMiddleware:
         """Extract user context from headers"""
         
         # Method 1: JWT token in Authorization header
-        auth_header = headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            token = auth_header[7:]
+        scheme, _, token = headers.get(_AUTHORIZATION, '').partition(' ')
+        if scheme == _BEARER and token:
             return self._extract_from_jwt(token)
         
         # Method 2: Gateway-injected headers
-        user_id = headers.get('X-User-Id')
-        username = headers.get('X-User-Name')
+        user_id = headers.get(_X_USER_ID)
+        username = headers.get(_X_USER_NAME)
         
         if user_id and username:
             return self._extract_from_gateway_headers(headers)
         
         # Method 3: Internal service token
-        internal_token = headers.get('X-Internal-Auth')
+        internal_token = headers.get(_X_INTERNAL_AUTH)
         if internal_token:
             return self._extract_from_internal_token(internal_token)
         
@@ -125,14 +232,22 @@ class AuthMiddleware:
     
     def _extract_from_jwt(self, token: str) -> UserContext:
         """Extract user context from JWT token"""
+        cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        with self._cache_lock:
+            cached = self._jwt_cache.get(cache_key)
+        if cached is not None:
+            expires_at, user_context = cached
+            if expires_at is None or time.time() < expires_at:
+                return user_context
+        
         try:
-            if self.verify_signature and self.jwt_secret:
-                payload = jwt.decode(token, self.jwt_secret, algorithms=['HS256'])
+            if self.verify_signature and self._jwt_key:
+                payload = self._jwt_decoder.decode(token, self._jwt_key, algorithms=_JWT_ALGORITHMS)
             else:
                 # For development/internal use - decode without verification
-                payload = jwt.decode(token, options={"verify_signature": False})
+                payload = self._jwt_decoder.decode(token, options={"verify_signature": False})
             
-            return UserContext(
+            user_context = UserContext(
                 user_id=payload.get('user_id'),
                 username=payload.get('username'),
                 full_name=payload.get('full_name'),
@@ -142,48 +257,32 @@ class AuthMiddleware:
             )
         except jwt.InvalidTokenError as e:
             raise InvalidTokenError(f"Invalid JWT token: {e}")
+        
+        # Respect the token's own exp on top of the cache TTL
+        exp = payload.get('exp')
+        expires_at = float(exp) if isinstance(exp, (int, float)) else None
+        with self._cache_lock:
+            self._jwt_cache[cache_key] = (expires_at, user_context)
+        
+        return user_context
     
     def _extract_from_gateway_headers(self, headers: Dict[str, str]) -> UserContext:
         """Extract user context from gateway-injected headers"""
-        
-        def decode_header_value(value: str) -> str:
-            """Decode base64 encoded header value"""
-            try:
-                return base64.b64decode(value).decode('utf-8')
-            except:
-                return value
-        
-        user_id = headers.get('X-User-Id', '')
-        username = headers.get('X-User-Name', '')
-        full_name = decode_header_value(headers.get('X-User-Full-Name', ''))
-        
-        # Parse roles and permissions
-        roles_str = headers.get('X-User-Service-Roles', '')
-        permissions_str = headers.get('X-User-Service-Permissions', '')
-        
-        roles = [r.strip() for r in roles_str.split(',') if r.strip()] if roles_str else []
-        permissions = [p.strip() for p in permissions_str.split(',') if p.strip()] if permissions_str else []
-        
-        is_admin = headers.get('X-User-Admin', 'false').lower() == 'true'
-        
-        return UserContext(
-            user_id=user_id,
-            username=username,
-            full_name=full_name,
-            roles=roles,
-            permissions=permissions,
-            is_admin=is_admin,
-            raw_headers=dict(headers)
-        )
+        fields = {field: parse(headers.get(header, '')) for header, field, parse in _GATEWAY_SPEC}
+        return UserContext(raw_headers=headers, **fields)
     
     def _extract_from_internal_token(self, token: str) -> UserContext:
         """Extract user context from internal service token"""
+        with self._cache_lock:
+            user_context = self._internal_cache.get(token)
+        if user_context is not None:
+            return user_context
+        
         try:
-            # Decode base64 token
-            decoded = base64.b64decode(token).decode('utf-8')
-            data = json.loads(decoded)
+            # Decode base64 token (binascii.Error and JSON errors are ValueErrors)
+            data = _json.loads(base64.b64decode(token))
             
-            return UserContext(
+            user_context = UserContext(
                 user_id=data.get('user_id'),
                 username=data.get('username'),
                 full_name=data.get('full_name'),
@@ -191,8 +290,16 @@ class AuthMiddleware:
                 permissions=data.get('permissions', []),
                 is_admin=data.get('is_admin', False)
             )
-        except (ValueError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        except ValueError as e:
             raise InvalidTokenError(f"Invalid internal token: {e}")
+        
+        with self._cache_lock:
+            self._internal_cache[token] = user_context
+        
+        return user_context
+
+
+_user_ctxvar: ContextVar[Optional[UserContext]] = ContextVar('user_ctx', default=None)
 
 
 def get_current_user() -> Optional[UserContext]:
@@ -200,30 +307,90 @@ def get_current_user() -> Optional[UserContext]:
     return getattr(g, 'user', None)
 
 
-def require_permission(permission: str, allow_admin: bool = True):
-    """Decorator to require specific permission"""
+@contextmanager
+def set_user_context(user_context: Optional[UserContext]):
+    """
+    Seed the user context for nested in-process requests
+    
+    Requests dispatched inside the block skip header extraction and reuse
+    ``user_context``. The previous value is restored on exit, so the seed
+    never leaks into unrelated requests served by the same worker.
+    
+    Example:
+        with set_user_context(get_current_user()):
+            response = app.test_client().get("/internal/report")
+    """
+    token = _user_ctxvar.set(user_context)
+    try:
+        yield user_context
+    finally:
+        _user_ctxvar.reset(token)
+
+
+def _prebuilt_json_response(payload: Dict[str, Any], status: int) -> Callable:
+    """Serialize an error payload once; the returned factory only wraps it in a Response"""
+    body = json.dumps(payload, separators=(',', ':')) + '\n'
+    
+    def respond():
+        return current_app.response_class(body, status=status, mimetype='application/json')
+    
+    return respond
+
+
+_auth_required_response = _prebuilt_json_response({
+    "error": "Authentication required",
+    "code": "AUTH_REQUIRED"
+}, 401)
+
+
+def require_permission(permission: str, allow_admin: bool = True,
+                       resolve_via_auth_client: bool = False):
+    """Decorator to require specific permission.
+    
+    With resolve_via_auth_client=True, a non-admin user whose context carries
+    no permissions has them loaded through g.auth_client (cached there,
+    including empty answers) into a copy of the context set as g.user.
+    This needs the legacy /api/users/{id}/permissions/{service_key}
+    endpoint, which current auth-service does not provide, so the option
+    is deprecated.
+    """
+    if resolve_via_auth_client:
+        import warnings
+        warnings.warn(
+            "require_permission(resolve_via_auth_client=True) relies on the deprecated "
+            "AuthClient.get_user_permissions() endpoint. "
+            "Use X-User-Service-Permissions header from nginx gateway instead.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+    
+    permission_denied_response = _prebuilt_json_response({
+        "error": f"Permission denied: {permission}",
+        "code": "PERMISSION_DENIED",
+        "required_permission": permission
+    }, 403)
+    
     def decorator(f: Callable) -> Callable:
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            user = get_current_user()
+            user = g.get('user')
             
-            if not user:
-                return jsonify({
-                    "error": "Authentication required",
-                    "code": "AUTH_REQUIRED"
-                }), 401
+            if user is None:
+                return _auth_required_response()
             
-            # Admin bypass
-            if allow_admin and user.is_admin:
-                return f(*args, **kwargs)
+            is_admin = allow_admin and user.is_admin
+            if resolve_via_auth_client and not is_admin and not user._permissions_set:
+                auth_client = g.get('auth_client')
+                if auth_client is not None:
+                    user = g.user = user._with_permissions(
+                        auth_client._get_user_permissions(user.user_id)
+                    )
             
-            # Check permission
-            if not user.has_permission(permission):
-                return jsonify({
-                    "error": f"Permission denied: {permission}",
-                    "code": "PERMISSION_DENIED",
-                    "required_permission": permission
-                }), 403
+            # Admin bypass, then exact match, then wildcard grants
+            if not is_admin \
+                    and permission not in user._permissions_set \
+                    and not user.has_permission(permission):
+                return permission_denied_response()
             
             return f(*args, **kwargs)
         
@@ -233,28 +400,26 @@ def require_permission(permission: str, allow_admin: bool = True):
 
 def require_any_permission(permissions: List[str], allow_admin: bool = True):
     """Decorator to require any of the specified permissions"""
+    permission_set = frozenset(permissions)
+    permission_denied_response = _prebuilt_json_response({
+        "error": f"Permission denied. Required one of: {', '.join(permissions)}",
+        "code": "PERMISSION_DENIED",
+        "required_permissions": permissions
+    }, 403)
+    
     def decorator(f: Callable) -> Callable:
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            user = get_current_user()
-            
-            if not user:
-                return jsonify({
-                    "error": "Authentication required", 
-                    "code": "AUTH_REQUIRED"
-                }), 401
+            user = g.get('user')
             
-            # Admin bypass
-            if allow_admin and user.is_admin:
-                return f(*args, **kwargs)
+            if user is None:
+                return _auth_required_response()
             
-            # Check permissions
-            if not user.has_any_permission(permissions):
-                return jsonify({
-                    "error": f"Permission denied. Required one of: {', '.join(permissions)}",
-                    "code": "PERMISSION_DENIED",
-                    "required_permissions": permissions
-                }), 403
+            # Admin bypass, then exact match, then wildcard grants
+            if not (allow_admin and user.is_admin) \
+                    and permission_set.isdisjoint(user._permissions_set) \
+                    and not (user._wildcard_prefixes and user.has_any_permission(permission_set)):
+                return permission_denied_response()
             
             return f(*args, **kwargs)
         
@@ -264,30 +429,25 @@ def require_any_permission(permissions: List[str], allow_admin: bool = True):
 
 def require_role(role: str, allow_admin: bool = True):
     """Decorator to require specific role (for backward compatibility)"""
+    role_denied_response = _prebuilt_json_response({
+        "error": f"Role denied: {role}",
+        "code": "ROLE_DENIED", 
+        "required_role": role
+    }, 403)
+    
     def decorator(f: Callable) -> Callable:
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            user = get_current_user()
-            
-            if not user:
-                return jsonify({
-                    "error": "Authentication required",
-                    "code": "AUTH_REQUIRED"
-                }), 401
+            user = g.get('user')
             
-            # Admin bypass
-            if allow_admin and user.is_admin:
-                return f(*args, **kwargs)
+            if user is None:
+                return _auth_required_response()
             
-            # Check role
-            if not user.has_role(role):
-                return jsonify({
-                    "error": f"Role denied: {role}",
-                    "code": "ROLE_DENIED", 
-                    "required_role": role
-                }), 403
+            # Admin bypass, then role check
+            if not (allow_admin and user.is_admin) and role not in user._roles_set:
+                return role_denied_response()
             
             return f(*args, **kwargs)
         
         return decorated_function
-    return decorator
\ No newline at end of file
+    return decorator
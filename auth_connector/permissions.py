@@ -3,9 +3,9 @@ Permission registry for service-specific permissions.
 Allows services to declare their available permissions and sync them with auth-service.
 """
 
-import json
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set
 from dataclasses import dataclass
+from . import _json
 from .exceptions import ConfigurationError
 
 
@@ -24,7 +24,11 @@ class PermissionRegistry:
     def __init__(self, service_key: str):
         self.service_key = service_key
         self._permissions: Dict[str, Permission] = {}
-        self._categories: Dict[str, List[str]] = {}
+        self._categories: Dict[str, List[Permission]] = {}
+        self._category_names: Dict[str, Set[str]] = {}
+        # Serialized forms, rebuilt lazily after each register()
+        self._dict_cache: Optional[Dict] = None
+        self._json_cache: Optional[str] = None
     
     def register(self, name: str, display_name: str, description: str, category: str = None) -> Permission:
         """Register a new permission"""
@@ -38,13 +42,30 @@ class PermissionRegistry:
             category=category
         )
         
+        previous = self._permissions.get(name)
+        if previous is not None and previous.category and previous.category != category:
+            # Moved to another category: drop it from the old one
+            self._category_names[previous.category].discard(name)
+            self._categories[previous.category] = [
+                p for p in self._categories[previous.category] if p.name != name
+            ]
+        
         self._permissions[name] = permission
+        self._dict_cache = None
+        self._json_cache = None
         
         if category:
-            if category not in self._categories:
-                self._categories[category] = []
-            if name not in self._categories[category]:
-                self._categories[category].append(name)
+            permissions = self._categories.setdefault(category, [])
+            names = self._category_names.setdefault(category, set())
+            if name in names:
+                # Re-registration replaces the stored object in place
+                for i, existing in enumerate(permissions):
+                    if existing.name == name:
+                        permissions[i] = permission
+                        break
+            else:
+                names.add(name)
+                permissions.append(permission)
         
         return permission
     
@@ -58,12 +79,19 @@ class PermissionRegistry:
     
     def get_permissions_by_category(self, category: str) -> List[Permission]:
         """Get permissions by category"""
-        if category not in self._categories:
-            return []
-        return [self._permissions[name] for name in self._categories[category]]
+        return self._categories.get(category, []).copy()
     
     def to_dict(self) -> Dict:
-        """Convert to dictionary for API serialization"""
+        """Convert to dictionary for API serialization.
+        
+        The result is cached until the next register() and must not be mutated.
+        """
+        if self._dict_cache is None:
+            self._dict_cache = self._build_dict()
+        return self._dict_cache
+    
+    def _build_dict(self) -> Dict:
+        """Build the serializable dictionary"""
         return {
             "service_key": self.service_key,
             "permissions": [
@@ -80,7 +108,9 @@ class PermissionRegistry:
     
     def to_json(self) -> str:
         """Convert to JSON string"""
-        return json.dumps(self.to_dict(), indent=2, ensure_ascii=False)
+        if self._json_cache is None:
+            self._json_cache = _json.dumps_indented(self.to_dict())
+        return self._json_cache
 
 
 # Common permission patterns for reuse
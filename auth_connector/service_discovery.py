@@ -24,8 +24,12 @@ Usage:
     client.deregister()
 """
 
+import asyncio
+import functools
+import hashlib
 import os
-import requests
+import random
+import sched
 import threading
 import time
 import logging
@@ -33,15 +37,120 @@ import atexit
 import signal
 import sys
 import socket
-from typing import Optional, Dict
+import tempfile
+import weakref
+from typing import Optional, Dict, List, Set, Tuple
+
+from . import _json
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Minimum seconds between repeated registry warnings from one client
+_WARN_INTERVAL = 60.0
+
+# Seconds to stop calling the registry after it refused a connection
+_REGISTRY_COOLDOWN = 15.0
+
+# Heartbeats never get more frequent than this when adapting to keep-alive timeouts
+_MIN_HEARTBEAT_INTERVAL = 5
+
+# One daemon thread sends the heartbeats of every client in the process.
+# Adding a tick sets the wakeup event so an earlier deadline isn't slept through.
+_tick_wakeup = threading.Event()
+
+
+def _tick_delay(delay: float):
+    """Sleep until the next tick is due, or until a new tick is scheduled"""
+    _tick_wakeup.wait(delay)
+    _tick_wakeup.clear()
+
+
+_tick_scheduler = sched.scheduler(time.monotonic, _tick_delay)
+_tick_lock = threading.RLock()
+_tick_thread: Optional[threading.Thread] = None
+
+
+def _schedule_tick(at: float, action, *args) -> sched.Event:
+    """Run action(*args) on the shared heartbeat thread at monotonic time at"""
+    global _tick_thread
+    with _tick_lock:
+        event = _tick_scheduler.enterabs(at, 1, action, args)
+        _tick_wakeup.set()
+        # A thread inherited through fork() is never alive in the child
+        if _tick_thread is None or not _tick_thread.is_alive():
+            _tick_thread = threading.Thread(target=_run_ticks, daemon=True, name="heartbeat")
+            _tick_thread.start()
+    return event
+
+
+def _cancel_tick(event: sched.Event):
+    """Drop a pending tick (no-op if it already ran)"""
+    with _tick_lock:
+        try:
+            _tick_scheduler.cancel(event)
+        except ValueError:
+            return
+        _tick_wakeup.set()  # let the thread exit now if nothing else is scheduled
+
+
+def _run_ticks():
+    """Shared heartbeat thread: runs ticks until none are left"""
+    global _tick_thread
+    logger.info("Started heartbeat thread")
+    while True:
+        try:
+            _tick_scheduler.run()
+        except Exception as e:
+            logger.error(f"Heartbeat tick failed: {e}")
+        with _tick_lock:
+            if _tick_scheduler.empty():
+                _tick_thread = None
+                break
+    logger.info("Heartbeat thread stopped")
+
+
+def _reset_ticks_after_fork():
+    """Recreate heartbeat thread state in a forked child and resume inherited ticks"""
+    global _tick_wakeup, _tick_lock, _tick_thread
+    # Locks held by other parent threads at fork time would never be released
+    _tick_wakeup = threading.Event()
+    _tick_lock = threading.RLock()
+    _tick_thread = None
+    if not _tick_scheduler.empty():
+        _tick_thread = threading.Thread(target=_run_ticks, daemon=True, name="heartbeat")
+        _tick_thread.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_ticks_after_fork)
+
+
+@functools.lru_cache(maxsize=1)
+def _detect_container_name() -> str:
+    """
+    Get container name from environment or hostname (resolved once per process).
+    Priority:
+    1. CONTAINER_NAME env variable (set in docker-compose)
+    2. Hostname (fallback to short container ID)
+    """
+    container_name = os.getenv('CONTAINER_NAME')
+    if container_name:
+        logger.debug(f"Using CONTAINER_NAME from env: {container_name}")
+        return container_name
+    
+    hostname = socket.gethostname()
+    logger.debug(f"Using hostname as container_name: {hostname}")
+    return hostname
+
 
 class ServiceDiscoveryClient:
     """Client for automatic service registration with gateway"""
     
+    # Live clients in this process; shutdown handlers are installed once for all of them
+    _instances: "weakref.WeakSet[ServiceDiscoveryClient]" = weakref.WeakSet()
+    _handlers_installed = False
+    _handlers_lock = threading.Lock()
+    
     def __init__(
         self,
         service_key: str,
@@ -51,7 +160,8 @@ class ServiceDiscoveryClient:
         health_check_path: str = "/health",
         heartbeat_interval: int = 30,
         metadata: Optional[Dict[str, str]] = None,
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        batch_heartbeat: bool = False
     ):
         """
         Initialize service discovery client
@@ -65,50 +175,85 @@ class ServiceDiscoveryClient:
             heartbeat_interval: Seconds between heartbeat signals
             metadata: Additional service metadata
             api_key: Internal API key for auth-service /api/* endpoints (X-API-Key header)
+            batch_heartbeat: Send a single POST /heartbeat/batch for all clients
+                that opt in (falls back to per-client heartbeats if the registry
+                doesn't support it)
         """
         self.service_key = service_key
         self.internal_url = internal_url
         self.registry_url = registry_url
-        self.container_name = container_name or self._get_container_name()
+        self.container_name = container_name or _detect_container_name()
         self.health_check_path = health_check_path
         self.heartbeat_interval = heartbeat_interval
         self.metadata = metadata or {}
+        self.batch_heartbeat = batch_heartbeat
         self._api_key = api_key or os.getenv('INTERNAL_API_KEY', '')
         
-        # Session with default X-API-Key header
-        self._session = requests.Session()
-        if self._api_key:
-            self._session.headers['X-API-Key'] = self._api_key
+        # HTTP session is created on first use so importing this module stays cheap
+        self._session = None
         
-        self._heartbeat_thread: Optional[threading.Thread] = None
+        # Pending tick on the shared heartbeat thread (None when not running)
+        self._heartbeat_event: Optional[sched.Event] = None
         self._stop_heartbeat = threading.Event()
+        # Set by deregister() and shutdown to abort a register() backoff wait
+        self._cancel_register = threading.Event()
         self._registered = False
+        # Set once deregister() has succeeded so repeated shutdown hooks are no-ops
+        self._deregistered = False
+        # Digest of the register payload the registry currently holds
+        self._registered_digest: Optional[str] = None
+        # One-shot thread re-registering on behalf of the shared heartbeat thread
+        self._reregister_thread: Optional[threading.Thread] = None
+        # Registry-assigned id enabling body-less heartbeats (None if not provided)
+        self._instance_id: Optional[str] = None
+        # Cleared once the registry turns out to have no /heartbeat/{id} route
+        self._id_heartbeat = True
+        
+        # Request bodies are serialized once; heartbeats never change
+        self._json_headers = {"Content-Type": "application/json"}
+        self._heartbeat_body = _json.dumps({
+            "service_key": self.service_key,
+            "container_name": self.container_name
+        })
+        self._register_body: Optional[bytes] = None
         
-        # Register cleanup handlers — only stop heartbeat, do NOT deregister.
-        # Deregistration would trigger nginx config removal, causing 404 for
-        # all users during container restarts. The heartbeat timeout handles
-        # marking the instance as unhealthy automatically.
-        atexit.register(self.stop_heartbeat)
-        signal.signal(signal.SIGTERM, self._signal_handler)
-        signal.signal(signal.SIGINT, self._signal_handler)
+        # Warning throttle state for sustained registry outages
+        self._last_warn_at = float('-inf')
+        self._suppressed = 0
+        # Monotonic time until which registry calls are skipped after a connection error
+        self._cooldown_until = 0.0
+        # Whether a missing keep-alive on the registry was already reported
+        self._keepalive_warned = False
+        
+        ServiceDiscoveryClient._instances.add(self)
+        self._install_handlers()
     
-    def _get_container_name(self) -> str:
-        """
-        Get container name from environment or hostname.
-        Priority:
-        1. CONTAINER_NAME env variable (set in docker-compose)
-        2. Hostname (fallback to short container ID)
-        """
-        container_name = os.getenv('CONTAINER_NAME')
-        if container_name:
-            logger.debug(f"Using CONTAINER_NAME from env: {container_name}")
-            return container_name
+    @classmethod
+    def _install_handlers(cls):
+        """Install process-wide cleanup handlers once for all clients.
         
-        hostname = socket.gethostname()
-        logger.debug(f"Using hostname as container_name: {hostname}")
-        return hostname
+        Handlers only stop heartbeats, they do NOT deregister.
+        Deregistration would trigger nginx config removal, causing 404 for
+        all users during container restarts. The heartbeat timeout handles
+        marking the instance as unhealthy automatically.
+        """
+        with cls._handlers_lock:
+            if cls._handlers_installed:
+                return
+            atexit.register(cls._stop_all)
+            signal.signal(signal.SIGTERM, cls._signal_handler)
+            signal.signal(signal.SIGINT, cls._signal_handler)
+            cls._handlers_installed = True
+    
+    @classmethod
+    def _stop_all(cls):
+        """Stop heartbeats of all live clients"""
+        for client in list(cls._instances):
+            client._cancel_register.set()
+            client.stop_heartbeat()
     
-    def _signal_handler(self, signum, frame):
+    @classmethod
+    def _signal_handler(cls, signum, frame):
         """Handle termination signals.
         
         We intentionally do NOT deregister on shutdown. The auth-service
@@ -116,92 +261,291 @@ class ServiceDiscoveryClient:
         a temporary 502 instead of a permanent 404. The heartbeat timeout
         will mark the instance as unhealthy automatically.
         """
-        logger.info(f"Received signal {signum}, stopping heartbeat (NOT deregistering)...")
-        self.stop_heartbeat()
+        logger.info(f"Received signal {signum}, stopping heartbeats (NOT deregistering)...")
+        cls._stop_all()
         sys.exit(0)
     
-    def register(self, max_retries: int = 10, retry_delay: int = 3) -> bool:
+    def register(self, max_retries: int = 10, retry_delay: int = 3,
+                 backoff_cap: int = 60, jitter: bool = True) -> bool:
         """
         Register service with the registry with automatic retries
         
         Args:
             max_retries: Maximum number of registration attempts
-            retry_delay: Seconds to wait between retries
+            retry_delay: Base delay in seconds, doubled after every failed attempt
+            backoff_cap: Upper bound in seconds for the exponential delay
+            jitter: Add up to retry_delay seconds of random delay so that
+                services booting together don't retry in lockstep
             
         Returns:
             True if registration successful, False otherwise
         """
+        # A fresh event per call, so an earlier cancellation doesn't cut this one short
+        self._cancel_register = cancel = threading.Event()
+        
         for attempt in range(1, max_retries + 1):
-            try:
-                payload = {
-                    "service_key": self.service_key,
-                    "container_name": self.container_name,
-                    "internal_url": self.internal_url,
-                    "health_check_path": self.health_check_path,
-                    "metadata": self.metadata
-                }
-                
-                response = self._session.post(
-                    f"{self.registry_url}/register",
-                    json=payload,
-                    timeout=10
-                )
-                
-                if response.status_code == 200:
-                    self._registered = True
-                    logger.info(
-                        f"✓ Service '{self.service_key}' registered successfully "
-                        f"(container: {self.container_name}, url: {self.internal_url})"
-                    )
-                    return True
-                else:
-                    logger.warning(
-                        f"Registration attempt {attempt}/{max_retries} failed: "
-                        f"{response.status_code} - {response.text}"
-                    )
-                    
-            except requests.exceptions.ConnectionError as e:
-                logger.warning(
-                    f"Registration attempt {attempt}/{max_retries} failed: "
-                    f"Cannot connect to registry (auth-service might not be ready yet)"
-                )
-            except Exception as e:
-                logger.warning(
-                    f"Registration attempt {attempt}/{max_retries} failed: {e}"
+            if self._in_cooldown():
+                # Registry was unreachable moments ago - go straight to backoff
+                self._warn_throttled(
+                    f"Registration attempt {attempt}/{max_retries} skipped: "
+                    f"registry unreachable, cooling down"
                 )
+            elif self._register_once(attempt, max_retries):
+                return True
             
             # Don't sleep after the last attempt
             if attempt < max_retries:
-                logger.info(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
+                delay = min(backoff_cap, retry_delay * (2 ** (attempt - 1)))
+                if jitter:
+                    delay += random.uniform(0, retry_delay)
+                logger.info(f"Retrying in {delay:.1f} seconds...")
+                # Wake up early (and give up) if the client is being stopped
+                if cancel.wait(delay):
+                    logger.info(f"Registration of service '{self.service_key}' cancelled")
+                    return False
         
         logger.error(
             f"✗ Failed to register service '{self.service_key}' after {max_retries} attempts"
         )
         return False
     
+    def _register_once(self, attempt: int, max_retries: int) -> bool:
+        """Make a single registration attempt"""
+        import requests
+        
+        try:
+            response = self._get_session().post(
+                f"{self.registry_url}/register",
+                data=self._get_register_body(),
+                headers=self._json_headers,
+                timeout=10
+            )
+            self._cooldown_until = 0.0
+            
+            if response.status_code == 200:
+                self._registered = True
+                self._deregistered = False
+                self._instance_id = self._parse_instance_id(response)
+                self._check_keepalive(response)
+                self._registered_digest = self._register_digest()
+                self._save_state()
+                logger.info(
+                    f"✓ Service '{self.service_key}' registered successfully "
+                    f"(container: {self.container_name}, url: {self.internal_url})"
+                )
+                return True
+            else:
+                self._warn_throttled(
+                    f"Registration attempt {attempt}/{max_retries} failed: "
+                    f"{response.status_code} - {response.text}"
+                )
+                
+        except requests.exceptions.ConnectionError as e:
+            self._mark_registry_down()
+            self._warn_throttled(
+                f"Registration attempt {attempt}/{max_retries} failed: "
+                f"Cannot connect to registry (auth-service might not be ready yet)"
+            )
+        except Exception as e:
+            self._warn_throttled(
+                f"Registration attempt {attempt}/{max_retries} failed: {e}"
+            )
+        return False
+    
+    def _get_session(self):
+        """Return the keep-alive session, importing requests on first use"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            
+            # Keep-alive session so heartbeats reuse one warm connection,
+            # with default X-API-Key header. The pool holds a single blocking
+            # connection: a deregister racing a heartbeat waits for the socket
+            # instead of opening a second one.
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, pool_block=True, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"Connection": "keep-alive"})
+            if self._api_key:
+                session.headers['X-API-Key'] = self._api_key
+            self._session = session
+        return self._session
+    
+    def _in_cooldown(self) -> bool:
+        """Check if the registry was recently found unreachable"""
+        return time.monotonic() < self._cooldown_until
+    
+    def _mark_registry_down(self):
+        """Skip registry calls for a short while after a connection failure"""
+        self._cooldown_until = time.monotonic() + _REGISTRY_COOLDOWN
+    
+    def _check_keepalive(self, response):
+        """Fit heartbeat_interval within the registry's keep-alive idle timeout.
+        
+        A heartbeat sent after the server has dropped the idle connection pays
+        for a new handshake, so the interval is lowered to just under the
+        advertised timeout.
+        """
+        if response.headers.get("Connection", "").lower() == "close":
+            if not self._keepalive_warned:
+                self._keepalive_warned = True
+                logger.warning(
+                    f"Registry closes connections after each request; "
+                    f"every heartbeat will open a new connection"
+                )
+            return
+        
+        for param in response.headers.get("Keep-Alive", "").split(","):
+            name, _, value = param.strip().partition("=")
+            if name.lower() != "timeout":
+                continue
+            try:
+                timeout = int(value)
+            except ValueError:
+                return
+            if timeout < self.heartbeat_interval:
+                interval = max(_MIN_HEARTBEAT_INTERVAL, timeout - 2)
+                logger.warning(
+                    f"Registry advertises keep-alive timeout {timeout}s < "
+                    f"heartbeat_interval {self.heartbeat_interval}s; reducing interval to {interval}s"
+                )
+                self.heartbeat_interval = interval
+            return
+    
+    @staticmethod
+    def _parse_instance_id(response) -> Optional[str]:
+        """Extract the registry-assigned instance id from a register response"""
+        try:
+            instance_id = response.json().get("instance_id")
+        except (ValueError, AttributeError):
+            return None
+        return str(instance_id) if instance_id is not None else None
+    
+    def resume_or_register(self, **register_kwargs) -> bool:
+        """
+        Resume a recent registration of this container, or register from scratch.
+        
+        If the registry was last reached less than two heartbeat intervals ago
+        (e.g. the process was just restarted) with the same register payload
+        (internal_url, health_check_path, metadata), a single heartbeat
+        confirms the existing record; a 404 re-registers as usual. Otherwise,
+        or if the heartbeat fails, this falls back to register(**register_kwargs).
+        
+        Returns:
+            True if the service is registered, False otherwise
+        """
+        state = self._load_state()
+        if state is not None \
+                and time.time() - state.get("ts", 0) < 2 * self.heartbeat_interval \
+                and state.get("register_digest") == self._register_digest():
+            self._registered = True
+            self._deregistered = False
+            self._instance_id = state.get("instance_id")
+            self._registered_digest = state["register_digest"]
+            logger.info(
+                f"Found recent registration for '{self.service_key}' "
+                f"(container: {self.container_name}), confirming with a heartbeat"
+            )
+            if self.send_heartbeat():
+                return True
+            self._registered = False
+            self._instance_id = None
+            self._registered_digest = None
+        
+        return self.register(**register_kwargs)
+    
+    def _register_digest(self) -> str:
+        """Fingerprint of the current register payload"""
+        return hashlib.blake2b(self._get_register_body(), digest_size=16).hexdigest()
+    
+    @property
+    def _state_path(self) -> str:
+        """Local file remembering the last registry contact for this container"""
+        return os.path.join(
+            tempfile.gettempdir(),
+            f"auth_connector_{self.service_key}_{self.container_name}.json"
+        )
+    
+    def _load_state(self) -> Optional[Dict]:
+        """Read the saved registration state, if any"""
+        try:
+            with open(self._state_path, "rb") as f:
+                state = _json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+        return state if isinstance(state, dict) else None
+    
+    def _save_state(self):
+        """Record that the registry knows this instance as of now"""
+        path = self._state_path
+        try:
+            # mkstemp picks an unpredictable name and refuses to follow symlinks,
+            # which matters in the shared temp directory
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        except OSError as e:
+            logger.debug(f"Could not save registration state: {e}")
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_json.dumps({
+                    "instance_id": self._instance_id,
+                    "register_digest": self._registered_digest,
+                    "ts": time.time()
+                }))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f"Could not save registration state: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    
+    def _clear_state(self):
+        """Forget the saved registration state"""
+        try:
+            os.remove(self._state_path)
+        except OSError:
+            pass
+    
     def deregister(self) -> bool:
         """
-        Deregister service from the registry
+        Deregister service from the registry.
+        
+        Once a deregistration has succeeded, later calls return True
+        immediately; after a failure the next call tries again. The request
+        uses a short timeout so a slow registry doesn't eat into the
+        orchestrator's shutdown grace period.
         
         Returns:
             True if deregistration successful, False otherwise
         """
-        if not self._registered:
+        # Abort any registration still retrying in the background
+        self._cancel_register.set()
+        
+        if self._deregistered or not self._registered:
             return True
         
+        # Stop heartbeat first, even if the registry can't be told right now
+        self.stop_heartbeat()
+        
+        if self._in_cooldown():
+            logger.error(f"✗ Skipping deregistration: registry unreachable")
+            return False
+        
         try:
-            # Stop heartbeat first
-            self.stop_heartbeat()
-            
-            response = self._session.delete(
+            response = self._get_session().delete(
                 f"{self.registry_url}/unregister/{self.service_key}",
                 params={"container_name": self.container_name},
-                timeout=10
+                timeout=2
             )
+            self._cooldown_until = 0.0
             
             if response.status_code == 200:
                 self._registered = False
+                self._deregistered = True
+                self._session.close()
+                self._clear_state()
                 logger.info(f"✓ Service '{self.service_key}' deregistered successfully")
                 return True
             else:
@@ -222,75 +566,289 @@ class ServiceDiscoveryClient:
         Returns:
             True if heartbeat successful, False otherwise
         """
+        if self._in_cooldown():
+            self._warn_throttled(f"Heartbeat skipped: registry unreachable, cooling down")
+            return False
+        
+        import requests
+        
         try:
-            payload = {
-                "service_key": self.service_key,
-                "container_name": self.container_name
-            }
-            
-            response = self._session.post(
-                f"{self.registry_url}/heartbeat",
-                json=payload,
-                timeout=5
-            )
+            session = self._get_session()
+            url, body = self._heartbeat_request()
+            response = session.post(url, data=body, headers=self._json_headers, timeout=5)
+            if response.status_code == 404 and body is None:
+                # Unknown id or no id route at all: the JSON heartbeat tells them apart
+                response = session.post(
+                    f"{self.registry_url}/heartbeat",
+                    data=self._heartbeat_body,
+                    headers=self._json_headers,
+                    timeout=5
+                )
+                if response.status_code == 200:
+                    self._disable_id_heartbeat()
+            self._cooldown_until = 0.0
             
             if response.status_code == 200:
                 logger.debug(f"Heartbeat sent for '{self.service_key}'")
+                self._save_state()
                 return True
             elif response.status_code == 404:
-                # Instance not found - try to re-register
-                logger.warning(
-                    f"Heartbeat failed (404): Instance not found. Attempting to re-register..."
-                )
-                self._registered = False
-                if self.register(max_retries=3, retry_delay=2):
-                    logger.info("✓ Successfully re-registered after heartbeat failure")
-                    return True
-                else:
-                    logger.error("✗ Failed to re-register after heartbeat failure")
-                    return False
+                return self._handle_missing_instance()
             else:
-                logger.warning(
+                self._warn_throttled(
                     f"Heartbeat failed: {response.status_code} - {response.text}"
                 )
                 return False
                 
         except requests.exceptions.ConnectionError:
-            logger.warning(f"Heartbeat failed: Cannot connect to registry")
+            self._mark_registry_down()
+            self._warn_throttled(f"Heartbeat failed: Cannot connect to registry")
             return False
         except Exception as e:
-            logger.warning(f"Heartbeat exception: {e}")
+            self._warn_throttled(f"Heartbeat exception: {e}")
             return False
     
-    def _heartbeat_loop(self):
-        """Background thread for sending periodic heartbeats"""
-        logger.info(f"Started heartbeat thread (interval: {self.heartbeat_interval}s)")
+    def _warn_throttled(self, msg: str):
+        """Log a warning at most once per minute, counting the ones suppressed meanwhile"""
+        now = time.monotonic()
+        if now - self._last_warn_at < _WARN_INTERVAL:
+            self._suppressed += 1
+            return
+        if self._suppressed:
+            msg = f"{msg} (+{self._suppressed} similar warnings suppressed)"
+        logger.warning(msg)
+        self._last_warn_at = now
+        self._suppressed = 0
+    
+    def _heartbeat_request(self) -> Tuple[str, Optional[bytes]]:
+        """Return the heartbeat URL and JSON body (None for a body-less heartbeat)"""
+        if self._instance_id is not None and self._id_heartbeat:
+            # Lightweight heartbeat: the registry looks the instance up by id
+            return f"{self.registry_url}/heartbeat/{self._instance_id}", None
         
-        while not self._stop_heartbeat.is_set():
-            self.send_heartbeat()
-            self._stop_heartbeat.wait(self.heartbeat_interval)
+        return f"{self.registry_url}/heartbeat", self._heartbeat_body
+    
+    def _disable_id_heartbeat(self):
+        """Fall back to JSON heartbeats for a registry without /heartbeat/{id}"""
+        self._id_heartbeat = False
+        logger.info(
+            f"Registry {self.registry_url} does not support id-based heartbeats, "
+            f"falling back to JSON heartbeats"
+        )
+    
+    def _get_register_body(self) -> bytes:
+        """Return the serialized register payload, rebuilt only after update_metadata()"""
+        if self._register_body is None:
+            self._register_body = _json.dumps({
+                "service_key": self.service_key,
+                "container_name": self.container_name,
+                "internal_url": self.internal_url,
+                "health_check_path": self.health_check_path,
+                "metadata": self.metadata
+            })
+        return self._register_body
+    
+    def update_metadata(self, metadata: Dict[str, str]):
+        """Merge metadata sent on the next register() call"""
+        self.metadata.update(metadata)
+        self._register_body = None
+    
+    def _handle_missing_instance(self) -> bool:
+        """Re-register inline, or in the background when on the shared heartbeat thread.
         
-        logger.info("Heartbeat thread stopped")
+        Re-registration retries take tens of seconds; running them on the
+        heartbeat thread would stall every other client's heartbeats.
+        """
+        if threading.current_thread() is not _tick_thread:
+            return self._reregister_missing_instance()
+        
+        if self._reregister_thread is None or not self._reregister_thread.is_alive():
+            self._reregister_thread = threading.Thread(
+                target=self._reregister_missing_instance,
+                daemon=True,
+                name=f"reregister-{self.service_key}"
+            )
+            self._reregister_thread.start()
+        return False
+    
+    def _reregister_missing_instance(self) -> bool:
+        """Re-register after the registry reported this instance as unknown"""
+        logger.warning(
+            f"Heartbeat failed (404): Instance not found. Attempting to re-register..."
+        )
+        self._registered = False
+        self._instance_id = None
+        if self.register(max_retries=3, retry_delay=2):
+            logger.info("✓ Successfully re-registered after heartbeat failure")
+            return True
+        else:
+            logger.error("✗ Failed to re-register after heartbeat failure")
+            return False
+    
+    def _heartbeat_tick(self, stop: threading.Event, deadline: float):
+        """Send one heartbeat on the shared thread and schedule the next one"""
+        if stop.is_set():
+            return
+        try:
+            self.send_heartbeat()
+        finally:
+            # Schedule against absolute deadlines so slow RPCs don't stretch the cadence
+            deadline += self.heartbeat_interval
+            deadline = max(deadline, time.monotonic())  # catch up after a stall
+            with _tick_lock:
+                if not stop.is_set():
+                    self._heartbeat_event = _schedule_tick(
+                        deadline, self._heartbeat_tick, stop, deadline
+                    )
     
     def start_heartbeat(self):
-        """Start sending periodic heartbeats in background thread"""
-        if self._heartbeat_thread and self._heartbeat_thread.is_alive():
-            logger.warning("Heartbeat thread already running")
+        """Start sending periodic heartbeats from the shared heartbeat thread"""
+        if self.batch_heartbeat:
+            self._stop_heartbeat = threading.Event()
+            _HeartbeatScheduler.add(self)
             return
         
-        self._stop_heartbeat.clear()
-        self._heartbeat_thread = threading.Thread(
-            target=self._heartbeat_loop,
-            daemon=True,
-            name=f"heartbeat-{self.service_key}"
-        )
-        self._heartbeat_thread.start()
+        with _tick_lock:
+            if self._heartbeat_event is not None:
+                logger.warning("Heartbeat already running")
+                return
+            
+            # A fresh event per run, so a tick left over from an earlier run stays stopped
+            self._stop_heartbeat = stop = threading.Event()
+            now = time.monotonic()
+            self._heartbeat_event = _schedule_tick(now, self._heartbeat_tick, stop, now)
+        logger.info(f"Started heartbeat for '{self.service_key}' (interval: {self.heartbeat_interval}s)")
     
     def stop_heartbeat(self):
-        """Stop the heartbeat thread"""
-        if self._heartbeat_thread and self._heartbeat_thread.is_alive():
+        """Stop sending periodic heartbeats"""
+        with _tick_lock:
             self._stop_heartbeat.set()
-            self._heartbeat_thread.join(timeout=5)
+            event, self._heartbeat_event = self._heartbeat_event, None
+        if event is not None:
+            _cancel_tick(event)
+        if self.batch_heartbeat:
+            _HeartbeatScheduler.remove(self)
+
+
+class _HeartbeatScheduler:
+    """
+    Process-wide heartbeat sender for clients created with batch_heartbeat=True.
+    
+    A single tick on the shared heartbeat thread sends one POST /heartbeat/batch
+    per registry every min(heartbeat_interval) seconds instead of one request per client.
+    """
+    
+    _lock = threading.Lock()
+    _clients: Dict[Tuple[str, str], ServiceDiscoveryClient] = {}
+    _unsupported: Set[str] = set()  # registry URLs without /heartbeat/batch
+    _tick: Optional[sched.Event] = None
+    
+    @classmethod
+    def add(cls, client: ServiceDiscoveryClient):
+        """Include client in batched heartbeats, scheduling the batch tick if needed"""
+        with cls._lock:
+            cls._clients[(client.service_key, client.container_name)] = client
+            if cls._tick is None:
+                now = time.monotonic()
+                cls._tick = _schedule_tick(now, cls._batch_tick, now)
+    
+    @classmethod
+    def remove(cls, client: ServiceDiscoveryClient):
+        """Exclude client from batched heartbeats"""
+        key = (client.service_key, client.container_name)
+        with cls._lock:
+            if cls._clients.get(key) is client:
+                del cls._clients[key]
+    
+    @classmethod
+    def _batch_tick(cls, deadline: float):
+        """Send batched heartbeats and schedule the next batch while clients remain"""
+        with cls._lock:
+            clients = list(cls._clients.values())
+            if not clients:
+                cls._tick = None
+                return
+        
+        try:
+            groups: Dict[str, List[ServiceDiscoveryClient]] = {}
+            for client in clients:
+                groups.setdefault(client.registry_url, []).append(client)
+            for registry_url, group in groups.items():
+                cls._send(registry_url, group)
+        finally:
+            deadline += min(client.heartbeat_interval for client in clients)
+            deadline = max(deadline, time.monotonic())  # catch up after a stall
+            with cls._lock:
+                cls._tick = _schedule_tick(deadline, cls._batch_tick, deadline)
+    
+    @classmethod
+    def _send(cls, registry_url: str, clients: List[ServiceDiscoveryClient]):
+        """Send one batch heartbeat and dispatch per-instance results"""
+        if registry_url in cls._unsupported:
+            for client in clients:
+                client.send_heartbeat()
+            return
+        
+        # All clients in the group share the registry, so one cooldown covers them
+        if any(c._in_cooldown() for c in clients):
+            clients[0]._warn_throttled(f"Batch heartbeat skipped: registry unreachable, cooling down")
+            return
+        
+        import requests
+        
+        payload = {
+            "heartbeats": [
+                {"service_key": c.service_key, "container_name": c.container_name}
+                for c in clients
+            ]
+        }
+        try:
+            response = clients[0]._get_session().post(
+                f"{registry_url}/heartbeat/batch",
+                data=_json.dumps(payload),
+                headers=clients[0]._json_headers,
+                timeout=5
+            )
+        except requests.exceptions.ConnectionError:
+            for client in clients:
+                client._mark_registry_down()
+            clients[0]._warn_throttled(f"Batch heartbeat failed: Cannot connect to registry")
+            return
+        except Exception as e:
+            clients[0]._warn_throttled(f"Batch heartbeat exception: {e}")
+            return
+        for client in clients:
+            client._cooldown_until = 0.0
+        
+        if response.status_code in (404, 405):
+            logger.info(
+                f"Registry {registry_url} does not support batch heartbeats, "
+                f"falling back to per-service heartbeats"
+            )
+            cls._unsupported.add(registry_url)
+            for client in clients:
+                client.send_heartbeat()
+            return
+        
+        if response.status_code != 200:
+            clients[0]._warn_throttled(
+                f"Batch heartbeat failed: {response.status_code} - {response.text}"
+            )
+            return
+        
+        try:
+            results = response.json().get("results", [])
+        except (ValueError, AttributeError):
+            results = []
+        
+        by_key = {(c.service_key, c.container_name): c for c in clients}
+        for result in results:
+            client = by_key.get((result.get("service_key"), result.get("container_name")))
+            if client is not None and result.get("status") == 404:
+                del by_key[(client.service_key, client.container_name)]
+                client._handle_missing_instance()
+        for client in by_key.values():
+            client._save_state()
 
 
 # Flask integration
@@ -308,29 +866,20 @@ def init_service_discovery_flask(app, service_key: str, internal_url: str, **kwa
         if __name__ == "__main__":
             app.run(host="0.0.0.0", port=5000)
     """
-    print(f"[DEBUG] Creating ServiceDiscoveryClient for '{service_key}'")
     client = ServiceDiscoveryClient(service_key, internal_url, **kwargs)
     
-    # Register immediately on initialization
-    import threading
-    def register_async():
-        import time
-        print(f"[DEBUG] Background thread started for '{service_key}', waiting 2s...")
-        time.sleep(2)  # Wait for Flask to fully start
-        print(f"[DEBUG] Calling client.register() for '{service_key}'...")
-        if client.register():
-            print(f"[DEBUG] Registration successful, starting heartbeat for '{service_key}'...")
+    # Register shortly after initialization, once Flask has started serving
+    def do_register():
+        if client.resume_or_register():
             client.start_heartbeat()
             logger.info(f"✓ Service '{service_key}' registered at startup")
         else:
-            print(f"[DEBUG] Registration failed for '{service_key}'")
             logger.error(f"✗ Failed to register service '{service_key}' at startup")
     
-    # Start registration in background thread
-    print(f"[DEBUG] Starting background thread for '{service_key}'...")
-    thread = threading.Thread(target=register_async, daemon=True)
-    thread.start()
-    print(f"[DEBUG] Background thread started: {thread.is_alive()}")
+    # Deferred with a timer rather than a thread that sleeps before registering
+    timer = threading.Timer(2.0, do_register)
+    timer.daemon = True
+    timer.start()
     
     return client
 
@@ -351,15 +900,99 @@ def init_service_discovery_fastapi(app, service_key: str, internal_url: str, **k
             import uvicorn
             uvicorn.run(app, host="0.0.0.0", port=8000)
     """
+    try:
+        import httpx
+    except ImportError:  # pragma: no cover - optional dependency
+        httpx = None
+    
     client = ServiceDiscoveryClient(service_key, internal_url, **kwargs)
+    heartbeat = {}
     
     @app.on_event("startup")
     async def register_service():
-        if client.register():
+        if not client.resume_or_register():
+            return
+        
+        # Heartbeats run on the app's event loop when httpx is available;
+        # the background thread is only the fallback
+        if httpx is None or client.batch_heartbeat:
             client.start_heartbeat()
+            return
+        
+        headers = {'X-API-Key': client._api_key} if client._api_key else {}
+        try:
+            http_client = httpx.AsyncClient(http2=True, timeout=5, headers=headers)
+        except ImportError:
+            # h2 not installed - plain HTTP/1.1 keep-alive
+            http_client = httpx.AsyncClient(timeout=5, headers=headers)
+        heartbeat['http_client'] = http_client
+        heartbeat['task'] = asyncio.create_task(_async_heartbeat_loop(client, http_client))
     
     @app.on_event("shutdown")
     async def deregister_service():
+        task = heartbeat.pop('task', None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            await heartbeat.pop('http_client').aclose()
         client.deregister()
     
     return client
+
+
+async def _async_heartbeat_loop(client: ServiceDiscoveryClient, http_client):
+    """Send periodic heartbeats for client from the running event loop"""
+    import httpx
+    
+    logger.info(f"Started async heartbeat task (interval: {client.heartbeat_interval}s)")
+    loop = asyncio.get_running_loop()
+    next_at = loop.time()
+    
+    while True:
+        try:
+            if client._in_cooldown():
+                client._warn_throttled(f"Heartbeat skipped: registry unreachable, cooling down")
+            else:
+                await _async_send_heartbeat(client, http_client, loop)
+        except httpx.ConnectError:
+            client._mark_registry_down()
+            client._warn_throttled(f"Heartbeat failed: Cannot connect to registry")
+        except httpx.HTTPError as e:
+            client._warn_throttled(f"Heartbeat exception: {e}")
+        
+        next_at += client.heartbeat_interval
+        delay = next_at - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            next_at = loop.time()  # catch up after a stall
+
+
+async def _async_send_heartbeat(client: ServiceDiscoveryClient, http_client, loop):
+    """Send one heartbeat for client and handle the registry's answer"""
+    url, body = client._heartbeat_request()
+    response = await http_client.post(url, content=body, headers=client._json_headers)
+    if response.status_code == 404 and body is None:
+        # Unknown id or no id route at all: the JSON heartbeat tells them apart
+        response = await http_client.post(
+            f"{client.registry_url}/heartbeat",
+            content=client._heartbeat_body,
+            headers=client._json_headers
+        )
+        if response.status_code == 200:
+            client._disable_id_heartbeat()
+    client._cooldown_until = 0.0
+    
+    if response.status_code == 200:
+        logger.debug(f"Heartbeat sent for '{client.service_key}'")
+        client._save_state()
+    elif response.status_code == 404:
+        # Re-registration retries block, keep them off the event loop
+        await loop.run_in_executor(None, client._reregister_missing_instance)
+    else:
+        client._warn_throttled(
+            f"Heartbeat failed: {response.status_code} - {response.text}"
+        )
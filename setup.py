@@ -5,16 +5,26 @@ setup(
     version="1.1.1",
     author="Analytics Team",
     description="Universal authentication and service discovery module for microservices",
-    packages=find_packages(),
+    packages=find_packages(exclude=["tests*"]),
     install_requires=[
         "requests>=2.28.0",
+        "urllib3>=1.26",
         "PyJWT>=2.4.0",
-        "Flask>=2.0.0",
+        "cachetools>=4.0.0",
     ],
+    extras_require={
+        "flask": ["flask>=2.0.0"],
+        "fastapi": ["fastapi>=0.68.0"],
+        "django": ["django>=3.2.0"],
+        "async": ["httpx[http2]>=0.23.0"],
+        "fast": ["orjson>=3.0.0"],
+    },
     python_requires=">=3.7",
+    zip_safe=False,
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",
+        "License :: OSI Approved :: MIT License",
         "Programming Language :: Python :: 3",
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",